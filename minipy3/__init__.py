@@ -1,8 +1,8 @@
 from __future__ import annotations
-import ast, bz2, gzip, lzma, math, textwrap, zlib
-from ast import _Precedence
+import ast, bz2, functools, gzip, lzma, os, threading, zlib
+from ast import _INFSTR, _Precedence
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from decimal import Decimal
 from string import whitespace
 from textwrap import dedent
 from minipy3.semicolon import AddSemicolon, add_semicolons
@@ -10,18 +10,73 @@ from minipy3.semicolon import AddSemicolon, add_semicolons
 __all__ = ('Minimize', 'minimize', 'AddSemicolon', 'add_semicolons')
 
 
-def _get_indent(line):
-    return len(line) - len(textwrap.dedent(line))
+# Constant types that _write_constant writes as their plain repr
+_REPR_CONSTANTS = frozenset({int, bool, str, bytes, type(None)})
+_POW10 = {10**i: i for i in range(5, 40)}
+_POW10_MAX = max(_POW10)
+
+
+def _power_of_10(value):
+    """Returns p if value == 10**p and p >= 5, otherwise None"""
+    if (power := _POW10.get(value)) is None and value > _POW10_MAX:
+        # 10**p has exactly p trailing zero bits
+        power = (value & -value).bit_length() - 1
+        if 10**power != value:
+            return None
+        _POW10[value] = power
+    return power
+
+
+def _float_repr(value):
+    """repr(float) is already the shortest round-tripping form, only redundant zeros are dropped"""
+    short = repr(value)
+    if 'e' in short:
+        mantissa, exponent = short.split('e')
+        return f'{mantissa}e{int(exponent)}'
+    if short.endswith('.0'):
+        return short[:-1]
+    if short.startswith('0.'):
+        return short[1:]
+    if short.startswith('-0.'):
+        return '-' + short[2:]
+    return short.replace('inf', _INFSTR).replace('nan', f'({_INFSTR}-{_INFSTR})')
+
+
+def _const_repr(kind, value):
+    """
+    Returns the shortest source of an int or float constant.
+    Zero floats are not looked up in the cache, since 0.0 == -0.0
+    """
+    if kind is float and not value:
+        return _float_repr(value)
+    return _cached_const_repr(kind, value)
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_const_repr(kind, value):
+    if kind is float:
+        return _float_repr(value)
+    if (power_10 := _power_of_10(value)) is not None:
+        return f'10**{power_10}'
+    if value >= 1 << 17 and not value & (value - 1):
+        return f'2**{value.bit_length() - 1}'
+    return repr(value)
 
 
 class Minimize(AddSemicolon, ignore={'Import'}):
     """Class based on ast._Unparse for code compression (see ast.unparse)"""
     __slots__ = ()
     _indent_mem = 0
-    blocks = (
+    blocks = frozenset({
         'try', 'else', 'finally', 'except', 'except*', 'class', 'def', '@', 'if', 'elif', 'while', 'with', 'match',
         'for',
-        'async')
+        'async'})
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lines = [self._source]
+        self.import_names = []
+        self._import_pending = False
 
     def items_view(self, traverser, items):
         if len(items) == 1:
@@ -31,7 +86,7 @@ class Minimize(AddSemicolon, ignore={'Import'}):
             self.interleave(lambda: self.write(','), traverser, items)
 
     def fill(self, text=''):
-        if text and text.strip().split()[0] in self.blocks or self._indent != self._indent_mem or (
+        if text and text.lstrip().partition(' ')[0] in self.blocks or self._indent != self._indent_mem or (
                 self._source and self._source[-1] == ':'):
             self.maybe_newline()
             self._indent_mem = self._indent
@@ -40,7 +95,7 @@ class Minimize(AddSemicolon, ignore={'Import'}):
 
     @contextmanager
     def delimit(self, start, end):
-        if self._source and start.strip() == '(':
+        if start == '(' and self._source and self._source[-1].endswith(' '):
             self._source[-1] = self._source[-1].rstrip(' ')
         self.write(start)
         yield
@@ -56,59 +111,80 @@ class Minimize(AddSemicolon, ignore={'Import'}):
             for item in node:
                 self.traverse(item)
         else:
-            if self.import_names and self.import_names[-1] is not None and (node.__class__.__name__ != 'Import'):
-                self.import_names.append(None)
-                self.fill('import ')
-                self.interleave(lambda: self.write(','), self.traverse, [i for i in self.import_names if i])
-                self.write(';')
-                self.import_names.clear()
-            ast.NodeVisitor.visit(self, node)
+            if self._import_pending and node.__class__ is not ast.Import:
+                self._write_imports()
+            self.dispatch(node)
+
+    def _write_imports(self):
+        """Writes the names of consecutive Import statements as a single one"""
+        self._import_pending = False
+        self.fill('import ')
+        self._write_aliases(self.import_names)
+        self.write(';')
+        self.import_names.clear()
+
+    @contextmanager
+    def block(self, *, extra=None):
+        with super().block(extra=extra):
+            yield
+            if self._import_pending:
+                self._write_imports()
+
+    def maybe_newline(self):
+        """Starts a new logical line in _lines if it isn't the start of generated source"""
+        if self._source or len(self._lines) > 1:
+            self._source = []
+            self._source_append = self._source.append
+            self._lines.append(self._source)
 
     def visit(self, node):
+        self.import_names = []
+        self._import_pending = False
         self._source = []
+        self._source_append = self._source.append
+        self._lines = [self._source]
         self.traverse(node)
-        return self.post_process(''.join(self._source))
+        return self.post_process_lines([''.join(line) for line in self._lines])
+
+    def visit_Module(self, node):
+        super().visit_Module(node)
+        if self._import_pending:
+            self._write_imports()
+
+    @classmethod
+    def post_process(cls, source):
+        return cls.post_process_lines(source.splitlines())
 
     @staticmethod
-    def post_process(source):
-        lines = [line.rstrip(whitespace + ';') for line in source.splitlines()]
+    def post_process_lines(lines):
+        lines = [line.rstrip(whitespace + ';') for line in lines]
+        indents = [len(line) - len(line.lstrip(' \t')) for line in lines]
         ls2 = len(lines) - 2
-        to_del = []
-        for i in [i for i, l in enumerate(lines) if l.endswith(':')]:
-            line = lines[i]
-            back_line = lines[i + 1]
-            try:
-                next_line = lines[i + 2]
-            except IndexError:
-                next_line = ''
-            it_line_tabs = _get_indent(line)
-            if i != ls2 and (it_line_tabs >= _get_indent(back_line) or it_line_tabs < _get_indent(next_line)):
+        out = []
+        consumed = False
+        for i, line in enumerate(lines):
+            if consumed:
+                consumed = False
                 continue
-            lines[i] += back_line.strip()
-            to_del.append(i + 1)
-        offset = 0
-        for i in to_del:
-            i -= offset
-            del lines[i]
-            offset += 1
-        return '\n'.join(lines)
+            if line.endswith(':') and (i == ls2 or indents[i] < indents[i + 1] and indents[i] >= indents[i + 2]):
+                line += lines[i + 1].strip()
+                consumed = True
+            out.append(line)
+        return '\n'.join(out)
 
     def visit_Constant(self, node):
         value = node.value
-        if isinstance(value, tuple):
+        kind = value.__class__
+        if kind is int or kind is float:
+            source = _const_repr(kind, value)
+            with self.delimit_if('(', ')', '**' in source and self.get_precedence(node) > _Precedence.POWER):
+                self.write(source)
+        elif isinstance(value, tuple):
             with self.delimit('(', ')'):
-                self.items_view(self._write_constant, value)
-        elif isinstance(value, float):
-            self.write('0.' if (short := str(Decimal(str(value))).strip('0')) == '.' else short)
-        elif isinstance(value, int):
-            if value >= 10**5 and (not math.log10(value) % 1):
-                power_10 = int(math.log10(value))
-                self.traverse(ast.BinOp(ast.Num(10), ast.Pow(), ast.Num(power_10)))
-            elif value >= 2**17 and (not math.log2(value) % 1):
-                power_2 = int(math.log2(value))
-                self.traverse(ast.BinOp(ast.Num(2), ast.Pow(), ast.Num(power_2)))
-            else:
-                self.write(repr(value))
+                if not self._avoid_backslashes and all(item.__class__ in _REPR_CONSTANTS for item in value):
+                    self.write(','.join(map(repr, value)) + (',' if len(value) == 1 else ''))
+                else:
+                    self.items_view(self._write_constant, value)
         elif value is ...:
             self.write('...')
         else:
@@ -129,10 +205,9 @@ class Minimize(AddSemicolon, ignore={'Import'}):
             self.write(':=')
             self.traverse(node.value)
 
-    import_names = []
-
     def visit_Import(self, node):
         self.import_names.extend(node.names)
+        self._import_pending = True
 
     def visit_ImportFrom(self, node):
         self.fill('from ')
@@ -140,7 +215,13 @@ class Minimize(AddSemicolon, ignore={'Import'}):
         if node.module:
             self.write(node.module)
         self.write(' import ')
-        self.interleave(lambda: self.write(','), self.traverse, node.names)
+        self._write_aliases(node.names)
+
+    def _write_aliases(self, names):
+        if any(alias.asname for alias in names):
+            self.interleave(lambda: self.write(','), self.traverse, names)
+        else:
+            self.write(','.join([alias.name for alias in names]))
 
     def visit_Assign(self, node):
         self.fill()
@@ -156,7 +237,7 @@ class Minimize(AddSemicolon, ignore={'Import'}):
     def visit_AugAssign(self, node):
         self.fill()
         self.traverse(node.target)
-        self.write(self.binop[node.op.__class__.__name__] + '=')
+        self.write(self.binop_by_cls[type(node.op)] + '=')
         self.traverse(node.value)
 
     def visit_AnnAssign(self, node):
@@ -170,9 +251,20 @@ class Minimize(AddSemicolon, ignore={'Import'}):
             self.traverse(node.value)
 
     unop = {'Invert': '~', 'Not': 'not', 'UAdd': '+', 'USub': '-'}
+    unop_by_cls = {getattr(ast, k): v for k, v in unop.items()}
     unop_precedence = {'not': _Precedence.NOT, '~': _Precedence.FACTOR, '+': _Precedence.FACTOR,
                        '-': _Precedence.FACTOR}
 
+    def visit_UnaryOp(self, node):
+        operator = self.unop_by_cls[type(node.op)]
+        operator_precedence = self.unop_precedence[operator]
+        with self.require_parens(operator_precedence, node):
+            self.write(operator)
+            if operator_precedence is not _Precedence.FACTOR:
+                self.write(' ')
+            self.set_precedence(operator_precedence, node.operand)
+            self.traverse(node.operand)
+
     def visit_Return(self, node):
         self.fill('return')
         if node.value:
@@ -194,11 +286,11 @@ class Minimize(AddSemicolon, ignore={'Import'}):
 
     def visit_Global(self, node):
         self.fill('global ')
-        self.interleave(lambda: self.write(','), self.write, node.names)
+        self.write(','.join(node.names))
 
     def visit_Nonlocal(self, node):
         self.fill('nonlocal ')
-        self.interleave(lambda: self.write(','), self.write, node.names)
+        self.write(','.join(node.names))
 
     def visit_ClassDef(self, node):
         for deco in node.decorator_list:
@@ -249,13 +341,15 @@ class Minimize(AddSemicolon, ignore={'Import'}):
             self.traverse(node.body)
 
     def _write_str_avoiding_backslashes(self, string, _=None):
-        self.write(repr(dedent(string).strip('\n')))
+        if '\n' in string:
+            string = dedent(string).strip('\n')
+        self.write(repr(string))
 
     def _write_docstring(self, node):
         self.fill()
         if node.kind == 'u':
             self.write('u')
-        self._write_str_avoiding_backslashes(node.value)
+        self.write(repr(dedent(node.value).strip('\n')))
         self.write(';')
 
     def visit_List(self, node):
@@ -296,9 +390,12 @@ class Minimize(AddSemicolon, ignore={'Import'}):
         with self.delimit('{', '}'):
             self.interleave(lambda: self.write(','), write_item, zip(node.keys, node.values))
 
+    binop_by_cls = {getattr(ast, k): v for k, v in ast._Unparser.binop.items()}
+
     def visit_BinOp(self, node):
-        operator = self.binop[node.op.__class__.__name__]
+        operator = self.binop_by_cls[type(node.op)]
         operator_precedence = self.binop_precedence[operator]
+        traverse = self.traverse
         with self.require_parens(operator_precedence, node):
             if operator in self.binop_rassoc:
                 left_precedence = operator_precedence.next()
@@ -307,21 +404,25 @@ class Minimize(AddSemicolon, ignore={'Import'}):
                 left_precedence = operator_precedence
                 right_precedence = operator_precedence.next()
             self.set_precedence(left_precedence, node.left)
-            self.traverse(node.left)
+            traverse(node.left)
             self.write(operator)
             self.set_precedence(right_precedence, node.right)
-            self.traverse(node.right)
+            traverse(node.right)
 
     cmpops = {'Eq': '==', 'NotEq': '!=', 'Lt': '<', 'LtE': '<=', 'Gt': '>', 'GtE': '>=', 'Is': ' is ',
               'IsNot': ' is not ', 'In': ' in ', 'NotIn': ' not in '}
+    cmpops_by_cls = {getattr(ast, k): v for k, v in cmpops.items()}
 
     def visit_Compare(self, node):
         with self.require_parens(_Precedence.CMP, node):
             self.set_precedence(_Precedence.CMP.next(), node.left, *node.comparators)
-            self.traverse(node.left)
+            write = self.write
+            traverse = self.traverse
+            cmpops_by_cls = self.cmpops_by_cls
+            traverse(node.left)
             for o, e in zip(node.ops, node.comparators):
-                self.write(self.cmpops[o.__class__.__name__])
-                self.traverse(e)
+                write(cmpops_by_cls[type(o)])
+                traverse(e)
 
     def visit_Call(self, node):
         self.set_precedence(_Precedence.ATOM, node.func)
@@ -347,47 +448,34 @@ class Minimize(AddSemicolon, ignore={'Import'}):
             self.write(':')
             self.traverse(node.annotation)
 
+    def _write_arg(self, prefix, arg, default=None):
+        if prefix:
+            self.write(prefix)
+        self.traverse(arg)
+        if default:
+            self.write('=')
+            self.traverse(default)
+
     def visit_arguments(self, node):
-        first = True
+        sep = ''
         all_args = node.posonlyargs + node.args
+        posonly_count = len(node.posonlyargs)
         defaults = [None] * (len(all_args) - len(node.defaults)) + node.defaults
         for index, elements in enumerate(zip(all_args, defaults), 1):
-            a, d = elements
-            if first:
-                first = False
-            else:
-                self.write(',')
-            self.traverse(a)
-            if d:
-                self.write('=')
-                self.traverse(d)
-            if index == len(node.posonlyargs):
+            self._write_arg(sep, *elements)
+            sep = ','
+            if index == posonly_count:
                 self.write(',/')
-        if node.vararg or node.kwonlyargs:
-            if first:
-                first = False
-            else:
-                self.write(',')
-            self.write('*')
-            if node.vararg:
-                self.write(node.vararg.arg)
-                if node.vararg.annotation:
-                    self.write(':')
-                    self.traverse(node.vararg.annotation)
-        if node.kwonlyargs:
-            for a, d in zip(node.kwonlyargs, node.kw_defaults):
-                self.write(',')
-                self.traverse(a)
-                if d:
-                    self.write('=')
-                    self.traverse(d)
+        if node.vararg:
+            self._write_arg(sep + '*', node.vararg)
+            sep = ','
+        elif node.kwonlyargs:
+            self.write(sep + '*')
+            sep = ','
+        for a, d in zip(node.kwonlyargs, node.kw_defaults):
+            self._write_arg(',', a, d)
         if node.kwarg:
-            if not first:
-                self.write(',')
-            self.write('**' + node.kwarg.arg)
-            if node.kwarg.annotation:
-                self.write(':')
-                self.traverse(node.kwarg.annotation)
+            self._write_arg(sep + '**', node.kwarg)
 
     def visit_keyword(self, node):
         if node.arg is None:
@@ -453,22 +541,62 @@ class Minimize(AddSemicolon, ignore={'Import'}):
             self.interleave(lambda: self.write('|'), self.traverse, node.patterns)
 
 
+# The last one is required by compress_required, the LZMA "alone" format has the smallest header
+_COMPRESSORS = (('lzma', lzma.compress), ('zlib', zlib.compress), ('gzip', gzip.compress), ('bz2', bz2.compress),
+                ('lzma', functools.partial(lzma.compress, format=lzma.FORMAT_ALONE)))
+
+
+def _exec_decompress(name, blob):
+    return f'exec(__import__({name!r}).decompress({blob!r}))'
+
+
+_EXEC_DECOMPRESS_LEN = {name: len(_exec_decompress(name, b'')) for name, _ in _COMPRESSORS}
+# Smaller payloads compress faster than the thread hand-off costs
+_PARALLEL_COMPRESS_MIN = 1 << 16
+# Cleared by the minipy3 CLI in its worker processes, which already share the CPUs with each other
+_parallel_compress = True
+_compress_pool = None
+_compress_pool_lock = threading.Lock()
+
+
+def _compress_all(encoded):
+    """
+    Returns (name, blob) for every compressor in _COMPRESSORS.
+    Large payloads are compressed concurrently in a pool shared by the process (the C compressors release the GIL),
+    unless there is a single CPU or _parallel_compress is cleared
+    """
+    global _compress_pool
+    if not _parallel_compress or len(encoded) < _PARALLEL_COMPRESS_MIN or (os.cpu_count() or 1) < 2:
+        return [(name, func(encoded)) for name, func in _COMPRESSORS]
+    with _compress_pool_lock:
+        if _compress_pool is None:
+            _compress_pool = ThreadPoolExecutor(max_workers=len(_COMPRESSORS))
+    futures = [(name, _compress_pool.submit(func, encoded)) for name, func in _COMPRESSORS]
+    return [(name, future.result()) for name, future in futures]
+
+
 def minimize(raw_code, compress=True, compress_required=False):
     """
     Minimizes the passed code with the help of the Minimizer class;
     And if necessary or gives more compression, applies one of the compression algorithms: (lzma, zlib, gzip, bz2)
     """
+    return _minimize(raw_code, compress, compress_required)
+
+
+@functools.lru_cache(maxsize=64)
+def _minimize(raw_code, compress, compress_required):
+    """The result is cached, so duplicate sources skip the visiting and the compression"""
     minimized = Minimize().visit(ast.parse(raw_code)).strip(f'{whitespace};')
     codes = min((raw_code, minimized), key=len)
+    if not (compress or compress_required):
+        return codes
     encoded = minimized.encode()
+    blobs = _compress_all(encoded)
     if compress_required:
-        codes = f"exec(__import__('lzma').decompress({lzma.compress(encoded, lzma.FORMAT_ALONE)!r}))"
-        compress = True
-    if compress:
-        for mod in (lzma, zlib, gzip, bz2):
-            if len((_val := f'exec(__import__({mod.__name__!r}).decompress({mod.compress(encoded)!r}))')) < len(codes):
-                codes = _val
-        return _val if len(
-            (_val := f"exec(__import__('lzma').decompress({lzma.compress(encoded, lzma.FORMAT_ALONE)!r}))")) < len(
-            codes) else codes
+        codes = _exec_decompress(*blobs[-1])
+    for name, blob in blobs:
+        # repr(blob) is never shorter than the blob itself, so only potential winners are rendered
+        if len(blob) + _EXEC_DECOMPRESS_LEN[name] < len(codes) and len(
+                (_val := _exec_decompress(name, blob))) < len(codes):
+            codes = _val
     return codes
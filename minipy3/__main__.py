@@ -2,14 +2,18 @@ import argparse
 import ast
 import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, islice
 from pathlib import Path
 
+import minipy3
 from minipy3 import minimize
 
 
 def parse_args():
     parser = argparse.ArgumentParser('minipy3')
-    parser.add_argument('input', type=Path().glob, help='Input files rglob')
+    parser.add_argument('input', type=Path().rglob, help='Input files rglob (also matches in subfolders)')
     parser.add_argument('-o', '--out', type=Path().glob, help='Output files rglob')
     parser.add_argument('--no-compress', action='store_false', default=True,
                         help="Don't use compression algorithms (lzma, zlib, gzip or bz2)")
@@ -27,18 +31,52 @@ def get_relative_path(from_path):
         return from_path
 
 
-def minimizer(mod, inpout, compress):
-    for inp, out in inpout:
-        with open(inp, encoding='UTF-8') as inp_f:
-            raw = inp_f.read()
-            if not raw:
-                print('Empty input file.')
-                continue
-        with open(out, 'w', encoding='UTF-8') as out_f:
-            compressed = mod(raw, compress)
-            out_f.write(compressed)
+def unparse(code, compress):
+    if compress:
+        try:
+            consts = compile(code, '', 'exec').co_consts
+            return ast.unparse(ast.parse(__import__(consts[0]).decompress(consts[1])))
+        except Exception:
+            pass
+    return f'{ast.unparse(ast.parse(code)).strip()}\n'
+
+
+def process_one(mod, compress, in_pool, inpout):
+    """
+    Returns the paths with the source and result lengths (None for an empty input).
+    Inside the process pool the compressors run serially, the workers already use the CPUs
+    """
+    minipy3._parallel_compress = not in_pool
+    inp, out = inpout
+    with open(inp, encoding='UTF-8') as inp_f:
+        raw = inp_f.read()
+        if not raw:
+            return inp, out, None
+    with open(out, 'w', encoding='UTF-8') as out_f:
+        compressed = mod(raw, compress)
+        out_f.write(compressed)
+    return inp, out, (len(raw), len(compressed))
+
+
+def report(results):
+    for inp, out, lengths in results:
+        if lengths is None:
+            print('Empty input file.')
+            continue
+        raw_len, compressed_len = lengths
         print(
-            f"{get_relative_path(inp)}{f' -> {get_relative_path(out)}'} | Compressing level {1.0 - len(compressed) / len(raw):.3%}")
+            f"{get_relative_path(inp)}{f' -> {get_relative_path(out)}'} | Compressing level {1.0 - compressed_len / raw_len:.3%}")
+
+
+def minimizer(mod, inpout, compress):
+    """A process pool is only started for more than one input file"""
+    inpout = iter(inpout)
+    head = list(islice(inpout, 2))
+    if len(head) < 2:
+        report(map(partial(process_one, mod, compress, False), head))
+        return
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        report(executor.map(partial(process_one, mod, compress, True), chain(head, inpout), chunksize=1))
 
 
 def main():
@@ -47,15 +85,7 @@ def main():
     mod = minimize
     if args.unparse:
         suf = '.max'
-
-        def mod(code, compress):
-            if compress:
-                try:
-                    consts = compile(code, '', 'exec').co_consts
-                    return ast.unparse(ast.parse(__import__(consts[0]).decompress(consts[1])))
-                except Exception:
-                    pass
-            return f'{ast.unparse(ast.parse(code)).strip()}\n'
+        mod = unparse
     if not args.no_suffix:
         suf = ''
     input = args.input
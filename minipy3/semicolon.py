@@ -1,7 +1,13 @@
 from __future__ import annotations
 
 import ast
-import functools
+from contextlib import contextmanager
+
+
+def _node_classes(cls=ast.AST):
+    for sub in cls.__subclasses__():
+        yield sub
+        yield from _node_classes(sub)
 
 
 class AddSemicolon(ast._Unparser):
@@ -10,15 +16,15 @@ class AddSemicolon(ast._Unparser):
     add_semicolon_after = {'Return', 'Delete', 'Assign', 'AugAssign', 'AnnAssign', 'Raise', 'Assert', 'Import',
                            'ImportFrom', 'Global', 'Nonlocal', 'Expr', 'Pass', 'Break', 'Continue'}
 
-    def and_add(self, func):
+    @staticmethod
+    def and_add(func):
         """
         Decorate visitor functions.
         Designed for class extensibility.
         """
 
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            res = func(*args, **kwargs)
+        def wrapper(self, node, _func=func):
+            res = _func(self, node)
             self.write(';')
             return res
 
@@ -30,15 +36,69 @@ class AddSemicolon(ast._Unparser):
         the ignore argument will exclude the specified sequence from the add_semicolon_after sequence.
         """
         ignore = kwargs.get('ignore', {*()})
-        cls.add_semicolon_after ^= ignore
+        cls.add_semicolon_after = cls.add_semicolon_after ^ ignore
+        cls._build_dispatch()
+
+    @classmethod
+    def _build_dispatch(cls):
+        """Resolves the visitors of all known AST node classes at class definition time"""
+        cls._dispatch = {node_cls: cls._resolve(node_cls) for node_cls in _node_classes()}
+
+    @classmethod
+    def _resolve(cls, node_cls):
+        """Finds the visitor for node_cls, applying the and_add decorator if specified by add_semicolon_after"""
+        name = node_cls.__name__
+        method = getattr(cls, f'visit_{name}', None)
+        if method is None:
+            return cls.generic_visit
+        if name in cls.add_semicolon_after:
+            return cls.and_add(method)
+        return method
 
     def __init__(self, *args, **kwargs):
-        """Applies the and_add decorator to visitor nodes specified by add_semicolon_after"""
         super().__init__(*args, **kwargs)
-        for name in self.add_semicolon_after:
-            name = f'visit_{name}'
-            if hasattr(self, name):
-                setattr(self, name, self.and_add(getattr(self, name)))
+        self._source_append = self._source.append
+
+    def write(self, text, *texts):
+        """Add new source parts through the append bound to the current buffer"""
+        self._source_append(text)
+        if texts:
+            self._source.extend(texts)
+
+    @contextmanager
+    def buffered(self, buffer=None):
+        if buffer is None:
+            buffer = []
+        original_source = self._source
+        self._source = buffer
+        self._source_append = buffer.append
+        yield buffer
+        self._source = original_source
+        self._source_append = original_source.append
+
+    def visit(self, node):
+        self._source = []
+        self._source_append = self._source.append
+        self.traverse(node)
+        return ''.join(self._source)
+
+    def dispatch(self, node):
+        """ast.NodeVisitor.visit with the visitor cached per (visitor class, node class)"""
+        try:
+            method = type(self)._dispatch[node.__class__]
+        except KeyError:
+            method = type(self)._dispatch[node.__class__] = self._resolve(node.__class__)
+        return method(self, node)
+
+    def traverse(self, node):
+        if isinstance(node, list):
+            for item in node:
+                self.traverse(item)
+        else:
+            self.dispatch(node)
+
+
+AddSemicolon._build_dispatch()
 
 
 def add_semicolons(raw_code):